@@ -3,6 +3,12 @@
 import os
 import json
 from collections import Counter, defaultdict
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+from date_index import build_date_index, build_file_dates
 
 def load_extracted_data(json_file_path):
     """
@@ -20,6 +26,73 @@ def load_extracted_data(json_file_path):
     except:
         return []
 
+class GlobalTimelineView(Sequence):
+    """
+    Vue paresseuse, sans copie, sur la concaténation des timeline_points de
+    toutes les décisions. Les offsets cumulés donnent la décision de chaque
+    index global ; le point (avec "index" = index global) n'est construit
+    qu'à l'accès. Supporte len, accès aléatoire, slicing (une sous-vue) et
+    itération.
+    """
+
+    def __init__(self, timelines):
+        self._timelines = timelines
+        # offsets[k] = index global du premier point de la décision k
+        self._offsets = np.concatenate(([0], np.cumsum([len(t) for t in timelines], dtype=np.int64)))
+        # Toujours un range (sous-vues comprises) : __iter__ lit start/stop/step
+        self._positions = range(int(self._offsets[-1]))
+
+    def _subview(self, positions):
+        view = GlobalTimelineView.__new__(GlobalTimelineView)
+        view._timelines = self._timelines
+        view._offsets = self._offsets
+        view._positions = positions
+        return view
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._subview(self._positions[key])
+        return self._point_at(self._positions[key])
+
+    def __iter__(self):
+        positions = self._positions
+        if positions.step != 1:
+            for global_index in positions:
+                yield self._point_at(global_index)
+            return
+        # Parcours séquentiel : on avance décision par décision, sans recherche
+        k = int(np.searchsorted(self._offsets, positions.start, side="right")) - 1
+        global_index = positions.start
+        while global_index < positions.stop:
+            timeline = self._timelines[k]
+            local = global_index - int(self._offsets[k])
+            end = min(len(timeline), positions.stop - int(self._offsets[k]))
+            for tp in timeline[local:end]:
+                yield self._make_point(global_index, tp)
+                global_index += 1
+            k += 1
+
+    def _point_at(self, global_index):
+        k = int(np.searchsorted(self._offsets, global_index, side="right")) - 1
+        return self._make_point(global_index, self._timelines[k][global_index - int(self._offsets[k])])
+
+    @staticmethod
+    def _make_point(global_index, tp):
+        point = {
+            "index": global_index,
+            "speaker": tp.get("speaker", "#unknown"),
+            "wordcount": tp.get("wordcount", 0)
+        }
+        # Texte externalisé (snippet_store) : on ne copie que les références
+        if "snippet_refs" in tp:
+            point["snippet_refs"] = tp["snippet_refs"]
+        else:
+            point["paragraph_snippet"] = tp.get("paragraph_snippet", "")
+        return point
+
 def aggregate_all_data(all_data):
     """
     Parcourt la liste 'all_data' (un dict par fichier).
@@ -34,13 +107,29 @@ def aggregate_all_data(all_data):
     De plus, on crée un "global_decision_graph" fusionnant tous les
     'decision_graphs' en un seul :
       aggregator["global_decision_graph"] = {
-        "timeline_points": [...],  # concat de tous
+        "timeline_points": GlobalTimelineView,  # concat (vue paresseuse) de tous
         "transitions": {...},      # merge de tous
         "all_speakers": [...],     # union de tous
       }
 
+    Ainsi que deux tables pandas (voir build_decision_vote_tables) :
+      aggregated["decisions_table"]  # une ligne par décision
+      aggregated["votes_table"]      # une ligne par vote
+    et l'index des dates (voir date_index.py) :
+      aggregated["date_index"]       # une ligne par date citée dans les questions
+      aggregated["file_dates"]       # une date par fichier
+
     Puis on renvoie un dict 'aggregated' avec tout.
 
+    Attention : 'aggregated' n'est pas entièrement sérialisable en JSON.
+    Les clés suivantes ne le sont pas :
+      - "decisions_table", "votes_table", "date_index", "file_dates"
+        (pandas.DataFrame)
+      - aggregated["global_decision_graph"]["timeline_points"]
+        (GlobalTimelineView)
+    Les autres (compteurs, listes) sont des types JSON simples ; voir
+    corpus_service._stats_to_json pour une version JSON complète.
+
     Exemple d'accès :
       aggregated["global_decision_graph"]["timeline_points"]
       aggregated["global_decision_graph"]["transitions"]
@@ -86,8 +175,9 @@ def aggregate_all_data(all_data):
         }
     }
 
-    # On garde un "global_index" si on veut un index unique pour la timeline
-    global_index = 0
+    # Timelines de chaque décision, dans l'ordre : la vue globale s'appuie
+    # dessus sans les copier (voir GlobalTimelineView)
+    timelines = []
 
     for item in all_data:
         # presence_absence
@@ -136,21 +226,10 @@ def aggregate_all_data(all_data):
             transitions = dg.get("transitions", {})
 
             # On fusionne tout dans le "global_decision_graph"
+            timelines.append(tpoints)
             for tp in tpoints:
-                # On prend la structure, mais on modifie "index" => on utilise global_index
-                new_tp = {
-                    "index": global_index,
-                    "speaker": tp.get("speaker", "#unknown"),
-                    "wordcount": tp.get("wordcount", 0),
-                    "paragraph_snippet": tp.get("paragraph_snippet", "")
-                }
-                aggregated["global_decision_graph"]["timeline_points"].append(new_tp)
-                # On incrémente
-                global_index += 1
-
                 # On enregistre le speaker dans all_speakers
-                spk = new_tp["speaker"]
-                aggregated["global_decision_graph"]["all_speakers"].add(spk)
+                aggregated["global_decision_graph"]["all_speakers"].add(tp.get("speaker", "#unknown"))
 
             # transitions
             for tkey, tval in transitions.items():
@@ -164,7 +243,8 @@ def aggregate_all_data(all_data):
             res = analysis.get("result", "inconnu")
             aggregated["vote_result_counter"][res] += 1
 
-    # Convertir en types JSON-compatibles
+    # Convertir les compteurs en types JSON-compatibles (les tables pandas
+    # et la vue de timeline ajoutées plus bas ne le sont pas)
     aggregated["all_law_citations"] = sorted(list(aggregated["all_law_citations"]))
     aggregated["speakers_global_counter"] = dict(aggregated["speakers_global_counter"])
     aggregated["rapporteurs_count"] = dict(aggregated["rapporteurs_count"])
@@ -178,9 +258,231 @@ def aggregate_all_data(all_data):
     # On convertit set -> list
     all_speakers_set = aggregated["global_decision_graph"]["all_speakers"]
     aggregated["global_decision_graph"]["all_speakers"] = list(all_speakers_set)
+    # Points globaux (index unique) construits à la demande
+    aggregated["global_decision_graph"]["timeline_points"] = GlobalTimelineView(timelines)
+
+    # Tables colonnaires (non JSON) pour les groupby / tableaux croisés
+    aggregated["decisions_table"], aggregated["votes_table"] = build_decision_vote_tables(all_data)
+    # Index des dates (questions) et date de chaque fichier, pour l'activité dans le temps
+    aggregated["date_index"] = build_date_index(all_data)
+    aggregated["file_dates"] = build_file_dates(all_data, aggregated["date_index"])
 
     return aggregated
 
+def build_decision_vote_tables(all_data):
+    """
+    Construit deux tables pandas colonnaires pour les analyses croisées :
+      - decisions : une ligne par décision (file, decision_id, rapporteur,
+        president, nb_members_present, nb_speakers, mean_words_per_speaker,
+        rapporteur_words)
+      - votes : une ligne par vote (file, vote_index, result, president et
+        rapporteur du fichier)
+
+    Les colonnes de noms sont encodées en 'category' : un groupby ou un
+    pd.crosstab (ex. résultat des votes par président) ne touche alors que
+    des codes entiers.
+    """
+    dec_cols = defaultdict(list)
+    vote_cols = defaultdict(list)
+
+    for item in all_data:
+        file_name = item.get("file", "")
+        # Rôles du PV (module_roles_extraction), à défaut ceux de la 1re décision
+        first_dec = (item.get("decisions") or [{}])[0]
+        file_pres = item.get("president") or first_dec.get("president") or None
+        file_rap = item.get("rapporteur") or first_dec.get("rapporteur") or None
+
+        for i, dec in enumerate(item.get("decisions", [])):
+            rap = dec.get("rapporteur") or None
+            wps = dec.get("words_per_speaker", {}) or {}
+            wps_vals = [v for v in wps.values() if isinstance(v, (int, float))]
+            dec_cols["file"].append(file_name)
+            dec_cols["decision_index"].append(i)
+            dec_cols["decision_id"].append(dec.get("decision_id"))
+            dec_cols["rapporteur"].append(rap)
+            dec_cols["president"].append(dec.get("president") or None)
+            dec_cols["nb_members_present"].append(len(dec.get("members_present", []) or []))
+            dec_cols["nb_speakers"].append(len(wps))
+            dec_cols["mean_words_per_speaker"].append(
+                float(np.mean(wps_vals)) if wps_vals else np.nan
+            )
+            rap_words = wps.get(rap) if rap else None
+            dec_cols["rapporteur_words"].append(
+                float(rap_words) if isinstance(rap_words, (int, float)) else np.nan
+            )
+
+        for i, vt in enumerate(item.get("votes", [])):
+            analysis = vt.get("analysis", {}) or {}
+            vote_cols["file"].append(file_name)
+            vote_cols["vote_index"].append(i)
+            vote_cols["result"].append(analysis.get("result", "inconnu"))
+            vote_cols["president"].append(file_pres)
+            vote_cols["rapporteur"].append(file_rap)
+
+    decisions = pd.DataFrame({
+        "file": pd.Categorical(dec_cols["file"]),
+        "decision_index": np.asarray(dec_cols["decision_index"], dtype=np.int64),
+        "decision_id": pd.Series(dec_cols["decision_id"], dtype=object),
+        "rapporteur": pd.Categorical(dec_cols["rapporteur"]),
+        "president": pd.Categorical(dec_cols["president"]),
+        "nb_members_present": np.asarray(dec_cols["nb_members_present"], dtype=np.int64),
+        "nb_speakers": np.asarray(dec_cols["nb_speakers"], dtype=np.int64),
+        "mean_words_per_speaker": np.asarray(dec_cols["mean_words_per_speaker"], dtype=np.float64),
+        "rapporteur_words": np.asarray(dec_cols["rapporteur_words"], dtype=np.float64),
+    })
+    votes = pd.DataFrame({
+        "file": pd.Categorical(vote_cols["file"]),
+        "vote_index": np.asarray(vote_cols["vote_index"], dtype=np.int64),
+        "result": pd.Categorical(vote_cols["result"]),
+        "president": pd.Categorical(vote_cols["president"]),
+        "rapporteur": pd.Categorical(vote_cols["rapporteur"]),
+    })
+    return decisions, votes
+
+def _format_transition_key(speakers):
+    """
+    Clé texte d'une transition, au même format que les 'transitions'
+    précalculées : "(A,B)" pour un bigramme, "(A,B,C)" pour un trigramme...
+    """
+    return "(" + ",".join(speakers) + ")"
+
+def build_speaker_sequences(all_data):
+    """
+    Concatène les speakers de tous les 'timeline_points' de toutes les
+    décisions (tous fichiers confondus) en tableaux NumPy :
+      - speaker_codes : code entier du speaker de chaque point
+      - decision_ids  : numéro (global) de la décision du point
+      - wordcounts    : nombre de mots du point
+      - speakers      : tableau des noms, indexé par speaker_codes
+
+    'all_data' peut être filtré au préalable (fichiers ou décisions retirés) :
+    les séquences reflètent exactement ce qui est passé.
+
+    C'est la seule étape en Python pur : pour un même corpus, la construire
+    une fois (LocalCorpus la garde) et la passer à speaker_transitions_from_sequences.
+    """
+    speaker_names = []
+    wordcounts = []
+    lengths = []
+    for item in all_data:
+        for dg in item.get("decision_graphs", []):
+            tpoints = dg.get("timeline_points", [])
+            speaker_names.extend([tp.get("speaker", "#unknown") for tp in tpoints])
+            wordcounts.extend([tp.get("wordcount", 0) for tp in tpoints])
+            lengths.append(len(tpoints))
+
+    # Encodage par hachage (pas de tri d'objets) ; sort=True garde les codes
+    # dans l'ordre alphabétique des noms
+    speaker_codes, speakers = pd.factorize(pd.Series(speaker_names, dtype=object), sort=True)
+    return {
+        "speaker_codes": speaker_codes.astype(np.int64),
+        "decision_ids": np.repeat(np.arange(len(lengths), dtype=np.int64), lengths),
+        "wordcounts": np.asarray(wordcounts, dtype=np.int64),
+        "speakers": np.asarray(speakers, dtype=object),
+    }
+
+def _turn_starts(speaker_codes, decision_ids):
+    """
+    Masque booléen des points qui ouvrent un nouveau tour de parole :
+    premier point d'une décision, ou changement de speaker.
+    Même regroupement que merge_consecutive_timeline_points, mais vectorisé.
+    """
+    starts = np.ones(len(speaker_codes), dtype=bool)
+    if len(speaker_codes) > 1:
+        starts[1:] = (speaker_codes[1:] != speaker_codes[:-1]) | (decision_ids[1:] != decision_ids[:-1])
+    return starts
+
+def compute_speaker_transitions(all_data, n=2, merge_consecutive=False):
+    """
+    Raccourci : build_speaker_sequences puis speaker_transitions_from_sequences.
+    """
+    return speaker_transitions_from_sequences(
+        build_speaker_sequences(all_data), n=n, merge_consecutive=merge_consecutive
+    )
+
+def speaker_transitions_from_sequences(seqs, n=2, merge_consecutive=False):
+    """
+    Calcule, depuis les séquences de build_speaker_sequences, les transitions entre
+    speakers pour toutes les décisions en une seule passe NumPy :
+      - "ngrams" : {"(A,B)": nb, ...} (n-grammes de longueur n, jamais à
+        cheval sur deux décisions), au format des 'transitions' précalculées
+      - "turn_lengths" : {nb_points: nb_tours} distribution des longueurs de
+        tours de parole (points consécutifs d'un même speaker)
+      - "turn_words" : {speaker: nb_mots_moyen_par_tour}
+      - "all_speakers" : liste des speakers rencontrés
+
+    Si merge_consecutive=True, les points consécutifs d'un même speaker sont
+    d'abord fusionnés (comme merge_consecutive_timeline_points) : on n'a
+    alors plus de transitions "(A,A)".
+    """
+    if n < 1:
+        raise ValueError("n doit être >= 1")
+
+    codes = seqs["speaker_codes"]
+    dec_ids = seqs["decision_ids"]
+    wcs = seqs["wordcounts"]
+    speakers = seqs["speakers"]
+
+    result = {
+        "n": n,
+        "merge_consecutive": merge_consecutive,
+        "ngrams": {},
+        "turn_lengths": {},
+        "turn_words": {},
+        "all_speakers": [str(s) for s in speakers],
+    }
+    if len(codes) == 0:
+        return result
+
+    # Tours de parole : longueur (en points) et mots cumulés par tour
+    starts = _turn_starts(codes, dec_ids)
+    start_idx = np.flatnonzero(starts)
+    turn_len = np.diff(np.append(start_idx, len(codes)))
+    turn_spk = codes[start_idx]
+    turn_wc = np.add.reduceat(wcs, start_idx)
+
+    lengths, length_counts = np.unique(turn_len, return_counts=True)
+    result["turn_lengths"] = {int(l): int(c) for l, c in zip(lengths, length_counts)}
+
+    nb_turns = np.bincount(turn_spk, minlength=len(speakers))
+    words = np.bincount(turn_spk, weights=turn_wc, minlength=len(speakers))
+    present = np.flatnonzero(nb_turns)
+    result["turn_words"] = {
+        str(speakers[i]): float(words[i] / nb_turns[i]) for i in present
+    }
+
+    if merge_consecutive:
+        codes = turn_spk
+        dec_ids = dec_ids[start_idx]
+
+    if len(codes) < n:
+        return result
+
+    # Fenêtres glissantes de taille n, gardées seulement si la fenêtre
+    # reste dans une même décision (les decision_ids sont contigus).
+    windows = np.lib.stride_tricks.sliding_window_view(codes, n)
+    dec_windows = np.lib.stride_tricks.sliding_window_view(dec_ids, n)
+    windows = windows[dec_windows[:, 0] == dec_windows[:, -1]]
+    if len(windows) == 0:
+        return result
+
+    base = max(len(speakers), 1)
+    if base ** n < 2 ** 62:
+        # Chaque n-gramme devient un entier (codes en base nb_speakers) :
+        # np.unique trie alors des int64, pas des lignes (même ordre)
+        weights = base ** np.arange(n - 1, -1, -1, dtype=np.int64)
+        packed, gram_counts = np.unique(windows @ weights, return_counts=True)
+        grams = (packed[:, None] // weights) % base
+    else:
+        grams, gram_counts = np.unique(windows, axis=0, return_counts=True)
+    order = np.argsort(-gram_counts, kind="stable")
+    names = [str(s) for s in speakers]
+    result["ngrams"] = {
+        _format_transition_key([names[c] for c in gram]): count
+        for gram, count in zip(grams[order].tolist(), gram_counts[order].tolist())
+    }
+    return result
+
 def main():
     """
     Exemple d'utilisation : on lit le JSON, on agrège, on affiche en console.
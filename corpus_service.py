@@ -0,0 +1,391 @@
+# corpus_service.py
+
+"""
+Service local (optionnel) qui possède le corpus chargé et agrégé, pour que
+plusieurs réplicas Streamlit partagent une seule copie en mémoire.
+
+Lancement :
+  python corpus_service.py --json extracted_data_modular_all_modules.json \\
+      --address 127.0.0.1:8765            # HTTP local
+  python corpus_service.py --address unix:///tmp/isovote_corpus.sock
+
+Côté Streamlit : CORPUS_SERVICE_URL=http://127.0.0.1:8765 (ou unix://...)
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import pandas as pd
+
+from aggregator import (
+    aggregate_all_data, build_speaker_sequences, load_extracted_data, speaker_transitions_from_sequences
+)
+from snippet_store import SnippetStore, externalize_snippets, inline_snippets, resolve_snippet
+
+CORPUS_SERVICE_ENV = "CORPUS_SERVICE_URL"
+
+# Taille maximale d'une tranche de /timeline (textes réintégrés)
+MAX_TIMELINE_SLICE = 5000
+
+# Tables pandas de l'agrégation, envoyées en colonnes
+_TABLE_KEYS = ("decisions_table", "votes_table", "date_index", "file_dates")
+# Colonnes de noms des tables à ré-encoder en 'category' côté client
+_CATEGORICAL_COLUMNS = ("file", "rapporteur", "president", "result", "raw")
+
+class CorpusServiceError(Exception):
+    pass
+
+################################################
+# 1) Corpus en mémoire (local ou côté service)
+################################################
+
+class LocalCorpus:
+    """
+    Corpus chargé dans le processus courant : all_data, son SnippetStore et
+    l'agrégation. C'est aussi ce que le service interroge pour répondre.
+    CorpusClient expose les mêmes méthodes.
+    """
+
+    def __init__(self, all_data, snippet_store=None, aggregated=None):
+        self.all_data = all_data
+        self.snippet_store = snippet_store
+        self.aggregated = aggregated if aggregated is not None else aggregate_all_data(all_data)
+        self._files = {item["file"]: item for item in all_data if "file" in item}
+        self._speaker_sequences = None
+
+    @classmethod
+    def from_json(cls, json_file_path):
+        all_data = load_extracted_data(json_file_path)
+        snippet_store = SnippetStore()
+        externalize_snippets(all_data, snippet_store)
+        return cls(all_data, snippet_store)
+
+    def file_names(self):
+        return list(self._files)
+
+    def get_file(self, name):
+        return self._files.get(name)
+
+    def global_stats(self):
+        return self.aggregated
+
+    def timeline_length(self):
+        return len(self.aggregated["global_decision_graph"]["timeline_points"])
+
+    def timeline_slice(self, start, stop):
+        return list(self.aggregated["global_decision_graph"]["timeline_points"][start:stop])
+
+    def speaker_transitions(self, n=2, merge_consecutive=False):
+        # Tableaux NumPy construits une seule fois par corpus ; chaque appel ne
+        # fait ensuite que le travail vectorisé propre à n / merge_consecutive
+        if self._speaker_sequences is None:
+            self._speaker_sequences = build_speaker_sequences(self.all_data)
+        return speaker_transitions_from_sequences(
+            self._speaker_sequences, n=n, merge_consecutive=merge_consecutive
+        )
+
+    def close(self):
+        if getattr(self, "snippet_store", None) is not None:
+            self.snippet_store.close()
+
+    def __del__(self):
+        self.close()
+
+################################################
+# 2) Serveur HTTP (TCP local ou socket Unix)
+################################################
+
+def _stats_to_json(aggregated):
+    """
+    Version JSON de l'agrégation : sans la timeline globale (servie par
+    tranches via /timeline) et avec les tables en colonnes, les valeurs
+    manquantes (NaN, catégorie vide) devenant null.
+    """
+    stats = {}
+    for key, val in aggregated.items():
+        if key == "global_decision_graph":
+            stats[key] = {k: v for k, v in val.items() if k != "timeline_points"}
+        elif isinstance(val, pd.DataFrame):
+            stats[key] = {}
+            for col in val.columns:
+                values = val[col].dt.strftime("%Y-%m-%d") if col == "date" else val[col]
+                stats[key][col] = values.astype(object).where(values.notna(), None).tolist()
+        else:
+            stats[key] = val
+    return stats
+
+def _stats_from_json(stats):
+    for key, val in stats.items():
+        if key in _TABLE_KEYS:
+            table = pd.DataFrame(val)
+            for col in _CATEGORICAL_COLUMNS:
+                if col in table.columns:
+                    table[col] = table[col].astype("category")
+            if "date" in table.columns:
+                table["date"] = pd.to_datetime(table["date"])
+            stats[key] = table
+    return stats
+
+class CorpusRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive : les clients réutilisent leur connexion
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        corpus = self.server.corpus
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == "/files":
+                payload = corpus.file_names()
+            elif url.path == "/file":
+                item = corpus.get_file(params.get("name", ""))
+                if item is None:
+                    return self._send_json({"error": "fichier inconnu"}, status=404)
+                payload = inline_snippets(item, corpus.snippet_store)
+            elif url.path == "/stats":
+                # Identique pour toute la vie du service : les clients gardent
+                # leur copie décodée et ne la retéléchargent pas
+                if self.headers.get("If-None-Match") == self.server.stats_etag:
+                    return self._send_body(b"", status=304, etag=self.server.stats_etag)
+                return self._send_body(self.server.stats_body, etag=self.server.stats_etag)
+            elif url.path == "/timeline":
+                start = max(int(params.get("start", 0)), 0)
+                stop = int(params.get("stop", start + MAX_TIMELINE_SLICE))
+                stop = max(start, min(stop, start + MAX_TIMELINE_SLICE))
+                payload = {
+                    "length": corpus.timeline_length(),
+                    "points": [self._inline_point(pt) for pt in corpus.timeline_slice(start, stop)],
+                }
+            elif url.path == "/transitions":
+                payload = corpus.speaker_transitions(
+                    n=int(params.get("n", 2)),
+                    merge_consecutive=params.get("merge", "0") == "1"
+                )
+            else:
+                return self._send_json({"error": "route inconnue"}, status=404)
+        except ValueError as e:
+            return self._send_json({"error": str(e)}, status=400)
+        self._send_json(payload)
+
+    def _inline_point(self, pt):
+        new_pt = {k: v for k, v in dict(pt).items() if k != "snippet_refs"}
+        new_pt["paragraph_snippet"] = resolve_snippet(pt, self.server.corpus.snippet_store)
+        return new_pt
+
+    def _send_json(self, payload, status=200):
+        self._send_body(json.dumps(payload, ensure_ascii=False, allow_nan=False).encode("utf-8"), status=status)
+
+    def _send_body(self, body, status=200, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Sur un socket Unix, client_address est une chaîne (souvent vide)
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return "unix"
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind suppose un couple (host, port)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+def make_server(corpus, address):
+    """
+    'address' : "127.0.0.1:8765" ou "unix:///chemin/vers/socket".
+    """
+    if address.startswith("unix://"):
+        path = address[len("unix://"):]
+        if os.path.exists(path):
+            # Seul un ancien socket peut être remplacé, jamais un autre fichier
+            if not stat.S_ISSOCK(os.stat(path).st_mode):
+                raise CorpusServiceError(f"{path} existe et n'est pas un socket Unix")
+            os.remove(path)
+        server = UnixHTTPServer(path, CorpusRequestHandler)
+    else:
+        host, _, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), CorpusRequestHandler)
+    server.daemon_threads = True
+    server.corpus = corpus
+    # Calculé une fois : /stats est demandé à chaque rerun Streamlit.
+    # L'ETag change à chaque lancement du service (nouveau corpus chargé).
+    server.stats_body = json.dumps(
+        _stats_to_json(corpus.global_stats()), ensure_ascii=False, allow_nan=False
+    ).encode("utf-8")
+    server.stats_etag = f'"{uuid.uuid4().hex}"'
+    return server
+
+################################################
+# 3) Client (réplicas Streamlit)
+################################################
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self._unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self._unix_path)
+
+class CorpusClient:
+    """
+    Client léger du service : mêmes méthodes que LocalCorpus, textes déjà
+    réintégrés (snippet_store = None). Les connexions persistantes sont
+    gardées dans un petit pool partagé : chaque requête en emprunte une et
+    la rend ensuite, quel que soit le thread (Streamlit lance chaque rerun
+    dans un nouveau thread).
+    """
+
+    snippet_store = None
+
+    def __init__(self, url, timeout=30, max_idle=8):
+        self.url = url
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._pool_lock = threading.Lock()
+        # Stats décodées (DataFrames compris), partagées par toutes les
+        # sessions tant que le service renvoie le même ETag
+        self._stats = None
+        self._stats_etag = None
+
+    def _connect(self):
+        if self.url.startswith("unix://"):
+            return _UnixHTTPConnection(self.url[len("unix://"):], timeout=self.timeout)
+        parts = urlsplit(self.url)
+        return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+
+    def _checkout(self):
+        with self._pool_lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _release(self, conn):
+        with self._pool_lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _request(self, path, headers=None):
+        # Une relance, sur une connexion neuve, si la connexion empruntée au
+        # pool avait été fermée par le service
+        for attempt in range(2):
+            conn = self._checkout() if attempt == 0 else self._connect()
+            try:
+                conn.request("GET", path, headers=headers or {})
+                resp = conn.getresponse()
+                body = resp.read()
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                conn.close()
+                if attempt:
+                    raise CorpusServiceError(f"Service corpus injoignable ({self.url}) : {e}")
+                continue
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return resp, body
+
+    def _get(self, path, allow_missing=False):
+        # 404 = ressource absente (allow_missing, ex. fichier inconnu) ;
+        # ailleurs, route inconnue => service d'une autre version
+        resp, body = self._request(path)
+        if resp.status == 404 and allow_missing:
+            return None
+        if resp.status != 200:
+            raise CorpusServiceError(f"Erreur {resp.status} du service corpus sur {path}")
+        return json.loads(body.decode("utf-8"))
+
+    def file_names(self):
+        return self._get("/files")
+
+    def get_file(self, name):
+        return self._get("/file?name=" + quote(name), allow_missing=True)
+
+    def global_stats(self):
+        headers = {"If-None-Match": self._stats_etag} if self._stats_etag else None
+        resp, body = self._request("/stats", headers)
+        if resp.status == 304 and self._stats is not None:
+            return self._stats
+        if resp.status != 200:
+            raise CorpusServiceError(f"Erreur {resp.status} du service corpus sur /stats")
+        stats = _stats_from_json(json.loads(body.decode("utf-8")))
+        with self._pool_lock:
+            self._stats, self._stats_etag = stats, resp.getheader("ETag")
+        return stats
+
+    def timeline_length(self):
+        return self._get("/timeline?start=0&stop=0")["length"]
+
+    def timeline_slice(self, start, stop):
+        return self._get(f"/timeline?start={int(start)}&stop={int(stop)}")["points"]
+
+    def speaker_transitions(self, n=2, merge_consecutive=False):
+        res = self._get(f"/transitions?n={int(n)}&merge={int(bool(merge_consecutive))}")
+        # JSON transforme les clés entières en chaînes : on les restaure
+        res["turn_lengths"] = {int(k): v for k, v in res["turn_lengths"].items()}
+        return res
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_corpus_client(url):
+    """
+    Client partagé par URL (et donc son pool de connexions) entre toutes les
+    sessions et tous les reruns du processus.
+    """
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = CorpusClient(url)
+        return _clients[url]
+
+def main():
+    parser = argparse.ArgumentParser(description="Service local du corpus (JSON extrait)")
+    parser.add_argument("--json", default="extracted_data_modular_all_modules.json")
+    parser.add_argument("--address", default="127.0.0.1:8765",
+                        help="host:port ou unix:///chemin/vers/socket")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.json):
+        print(f"Fichier JSON introuvable : {args.json}")
+        return
+
+    corpus = LocalCorpus.from_json(args.json)
+    try:
+        server = make_server(corpus, args.address)
+    except CorpusServiceError as e:
+        print(e)
+        return
+    print(f"Corpus : {len(corpus.all_data)} fichiers, service sur {args.address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
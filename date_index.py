@@ -0,0 +1,255 @@
+# date_index.py
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+FRENCH_MONTHS = {
+    "janvier": 1, "fevrier": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6,
+    "juillet": 7, "aout": 8, "septembre": 9, "octobre": 10, "novembre": 11, "decembre": 12,
+    "janv": 1, "fevr": 2, "fev": 2, "avr": 4, "juil": 7, "sept": 9, "oct": 10,
+    "nov": 11, "dec": 12,
+}
+
+_MONTHS_RE = "|".join(sorted(FRENCH_MONTHS, key=len, reverse=True))
+_ISO_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+_NUMERIC_RE = re.compile(r"(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{2,4})")
+_TEXT_RE = re.compile(r"(?:(\d{1,2})(?:er)?\s+)?(" + _MONTHS_RE + r")\.?\s+(\d{4})")
+
+# L'index est en datetime64[ns] (1677-09-21 .. 2262-04-11) : au-delà, la
+# conversion déborde. On garde des années entières pour que les débuts de
+# semaine / de mois de bucket_dates restent eux aussi dans l'intervalle.
+_MIN_DATE = np.datetime64(f"{pd.Timestamp.min.year + 1}-01-01", "D")
+_MAX_DATE = np.datetime64(f"{pd.Timestamp.max.year - 1}-12-31", "D")
+
+# Date précédée d'une référence à un texte juridique : "loi du ...",
+# "décret n° 2004-374 du ...", "arrêté en date du ..." (texte normalisé)
+_LAW_CONTEXT_RE = re.compile(
+    r"\b(?:loi|decret|ordonnance|arrete|circulaire|directive|reglement|deliberation|arret|jugement|code)s?"
+    r"(?:\s+(?:organique|constitutionnelle|federale|cantonale|communale))?"
+    r"(?:\s+(?:n\s*[°o]|no|nr)\.?\s*[\w./-]+)?"
+    r"\s+(?:en\s+date\s+)?du\s*$"
+)
+
+# Écart maximal (en jours) entre une date candidate et la médiane des dates
+# du fichier pour être retenue comme date de séance
+MAX_DAYS_FROM_FILE_MEDIAN = 366
+
+def _normalize(text):
+    # minuscules, sans accents : "1er Février 2021" -> "1er fevrier 2021"
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def parse_date_string(text):
+    """
+    Convertit une date détectée (chaîne) en np.datetime64 au jour, NaT sinon.
+    Formats reconnus : "2021-03-12", "12/03/2021" (ou 12.03.21, 12-03-2021),
+    "12 mars 2021", "1er février 2021", "lundi 12 mars 2021", "mars 2021"
+    (-> 1er du mois). Les dates hors des années 1678-2261 (limites de
+    datetime64[ns]) donnent NaT.
+    """
+    if not isinstance(text, str):
+        return np.datetime64("NaT", "D")
+    norm = _normalize(text)
+
+    m = _ISO_RE.search(norm)
+    if m:
+        year, month, day = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    else:
+        m = _NUMERIC_RE.search(norm)
+        if m:
+            day, month, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+            if year < 100:
+                year += 2000 if year < 70 else 1900
+        else:
+            m = _TEXT_RE.search(norm)
+            if not m:
+                return np.datetime64("NaT", "D")
+            day = int(m.group(1)) if m.group(1) else 1
+            month = FRENCH_MONTHS[m.group(2)]
+            year = int(m.group(3))
+
+    try:
+        date = np.datetime64(f"{year:04d}-{month:02d}-{day:02d}", "D")
+    except ValueError:
+        return np.datetime64("NaT", "D")
+    if date < _MIN_DATE or date > _MAX_DATE:
+        return np.datetime64("NaT", "D")
+    return date
+
+def is_law_citation_date(paragraph, raw):
+    """
+    Vrai si la date 'raw' apparaît dans 'paragraph' juste après la mention
+    d'un texte juridique ("loi du 29 juillet 1881") : ce n'est alors pas une
+    date de séance.
+    """
+    if not isinstance(paragraph, str) or not isinstance(raw, str) or not raw:
+        return False
+    pos = paragraph.find(raw)
+    while pos != -1:
+        if _LAW_CONTEXT_RE.search(_normalize(paragraph[max(0, pos - 80):pos])):
+            return True
+        pos = paragraph.find(raw, pos + 1)
+    return False
+
+def build_date_index(all_data):
+    """
+    Index des dates de tous les questions[*].dates_paragraphs, trié par date :
+    une ligne par date reconnue, avec ses références
+      - file, question_index, paragraph_index (position dans dates_paragraphs)
+      - raw : la chaîne d'origine
+      - law_citation : date d'un texte juridique cité (is_law_citation_date)
+
+    Chaque chaîne distincte n'est analysée qu'une seule fois ; les dates non
+    reconnues sont écartées.
+    """
+    cols = {"raw": [], "file": [], "question_index": [], "paragraph_index": [], "law_citation": []}
+    for item in all_data:
+        file_name = item.get("file", "")
+        for q_idx, question in enumerate(item.get("questions", []) or []):
+            for p_idx, d_p in enumerate(question.get("dates_paragraphs", []) or []):
+                paragraph = d_p.get("paragraph", "")
+                for raw in d_p.get("dates", []) or []:
+                    cols["law_citation"].append(is_law_citation_date(paragraph, raw))
+                    cols["raw"].append(raw)
+                    cols["file"].append(file_name)
+                    cols["question_index"].append(q_idx)
+                    cols["paragraph_index"].append(p_idx)
+
+    raw = pd.Categorical(cols["raw"])
+    parsed = np.array([parse_date_string(s) for s in raw.categories], dtype="datetime64[D]")
+    dates = parsed[raw.codes] if len(raw) else np.zeros(0, dtype="datetime64[D]")
+
+    index = pd.DataFrame({
+        "date": dates.astype("datetime64[ns]"),
+        "file": pd.Categorical(cols["file"]),
+        "question_index": np.asarray(cols["question_index"], dtype=np.int64),
+        "paragraph_index": np.asarray(cols["paragraph_index"], dtype=np.int64),
+        "raw": raw,
+        "law_citation": np.asarray(cols["law_citation"], dtype=bool),
+    })
+    index = index[index["date"].notna()]
+    return index.sort_values("date", kind="stable").reset_index(drop=True)
+
+def build_file_dates(all_data, date_index):
+    """
+    Une date de séance par fichier (PV), triée, avec son nombre de mots.
+
+    Candidates : les dates du fichier qui ne sont pas des dates de textes
+    juridiques cités, et à moins de MAX_DAYS_FROM_FILE_MEDIAN jours de la
+    médiane de ces dates (une date isolée loin des autres est une référence,
+    pas la séance ; si aucune ne l'est, on garde le groupe de dates le plus
+    récent). On retient la plus citée, la plus récente en cas d'égalité. Les fichiers sans
+    candidate sont écartés (voir undated_files).
+    """
+    words = {
+        item.get("file", ""): (item.get("global_stats") or {}).get("total_words", 0)
+        for item in all_data
+    }
+    if date_index.empty:
+        file_dates = pd.DataFrame({
+            "file": pd.Categorical([]),
+            "date": np.zeros(0, dtype="datetime64[ns]"),
+            "total_words": np.zeros(0, dtype=np.int64),
+        })
+        return file_dates
+
+    candidates = date_index[~date_index["law_citation"]]
+    days = candidates["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    median = pd.Series(days, index=candidates.index).groupby(
+        candidates["file"], observed=True
+    ).transform("median").to_numpy()
+    latest = pd.Series(days, index=candidates.index).groupby(
+        candidates["file"], observed=True
+    ).transform("max").to_numpy()
+    near = pd.Series(np.abs(days - median) <= MAX_DAYS_FROM_FILE_MEDIAN, index=candidates.index)
+    # Dates en groupes éloignés (la médiane tombe entre eux) : on garde le
+    # groupe le plus récent, les autres étant des références passées
+    no_near = ~near.groupby(candidates["file"], observed=True).transform("any")
+    near |= no_near & (latest - days <= MAX_DAYS_FROM_FILE_MEDIAN)
+    candidates = candidates[near.to_numpy()]
+
+    counts = candidates.groupby(["file", "date"], observed=True).size().reset_index(name="n")
+    counts = counts.sort_values(["file", "n", "date"], ascending=[True, False, False], kind="stable")
+    best = counts.drop_duplicates("file")
+    file_dates = pd.DataFrame({
+        "file": pd.Categorical(best["file"].astype(str)),
+        "date": best["date"].to_numpy(),
+        "total_words": np.asarray([words.get(f, 0) for f in best["file"].astype(str)], dtype=np.int64),
+    })
+    return file_dates.sort_values("date", kind="stable").reset_index(drop=True)
+
+def date_range_slice(table, start=None, end=None):
+    """
+    Lignes de 'table' (triée par "date") dont la date est dans [start, end],
+    par recherche dichotomique, sans reparcourir les documents.
+    """
+    dates = table["date"].to_numpy()
+    lo = 0 if start is None else np.searchsorted(dates, np.datetime64(start, "ns"), side="left")
+    hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end, "ns"), side="right")
+    return table.iloc[lo:hi]
+
+def bucket_dates(dates, freq="M", weights=None):
+    """
+    Histogramme vectorisé : compte (ou somme les 'weights') par semaine
+    (freq="W", semaines commençant le lundi) ou par mois (freq="M").
+    Renvoie une Series indexée par le début de chaque période, sans trou.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    if weights is None:
+        weights = np.ones(len(dates), dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(dates) == 0:
+        return pd.Series(np.zeros(0), index=pd.DatetimeIndex([]), dtype=np.float64)
+
+    if freq == "M":
+        buckets = dates.astype("datetime64[M]")
+        first, last = buckets.min(), buckets.max()
+        positions = (buckets - first).astype(np.int64)
+        periods = np.arange(first, last + 1).astype("datetime64[D]")
+    elif freq == "W":
+        # 1970-01-01 était un jeudi : (jours + 3) % 7 == 0 pour un lundi
+        days = dates.astype(np.int64)
+        buckets = dates - ((days + 3) % 7).astype("timedelta64[D]")
+        first, last = buckets.min(), buckets.max()
+        positions = (buckets - first).astype(np.int64) // 7
+        periods = np.arange(first, last + 1, 7)
+    else:
+        raise ValueError("freq doit être 'W' ou 'M'")
+
+    totals = np.bincount(positions, weights=weights, minlength=len(periods))
+    return pd.Series(totals, index=pd.DatetimeIndex(periods.astype("datetime64[ns]")))
+
+def undated_files(aggregated):
+    """
+    Ce que activity_over_time ne peut pas placer dans le temps : nombre de
+    fichiers sans date de séance retenue, et leurs décisions / votes.
+    """
+    dated = set(aggregated["file_dates"]["file"].astype(str))
+    decisions = aggregated["decisions_table"]["file"].astype(str)
+    votes = aggregated["votes_table"]["file"].astype(str)
+    return {
+        "files": aggregated["total_files"] - len(dated),
+        "decisions": int((~decisions.isin(dated)).sum()),
+        "votes": int((~votes.isin(dated)).sum()),
+    }
+
+def activity_over_time(aggregated, freq="M", start=None, end=None):
+    """
+    Décisions, votes et mots par période, chaque fichier étant placé à sa
+    date (voir build_file_dates). Utilise les tables de l'agrégation :
+    file_dates, decisions_table, votes_table.
+    """
+    file_dates = date_range_slice(aggregated["file_dates"], start, end)
+    files = file_dates["file"].astype(str)
+    nb_decisions = aggregated["decisions_table"]["file"].astype(str).value_counts()
+    nb_votes = aggregated["votes_table"]["file"].astype(str).value_counts()
+
+    dates = file_dates["date"].to_numpy()
+    return pd.DataFrame({
+        "decisions": bucket_dates(dates, freq, files.map(nb_decisions).fillna(0).to_numpy()),
+        "votes": bucket_dates(dates, freq, files.map(nb_votes).fillna(0).to_numpy()),
+        "words": bucket_dates(dates, freq, file_dates["total_words"].to_numpy()),
+    })
@@ -0,0 +1,160 @@
+# snippet_store.py
+
+import copy
+import mmap
+import tempfile
+import threading
+
+SNIPPET_SEPARATOR = " ... "
+
+class SnippetStore:
+    """
+    Stockage externe, en ajout seul, des textes (snippets de timeline,
+    paragraphes de la chronologie) dans un unique fichier mappé en mémoire.
+
+    append(text) écrit le texte en UTF-8 à la fin du fichier et renvoie
+    (offset, length) en octets ; get(offset, length) ne décode le texte
+    qu'au moment où on en a besoin (étiquette survolée, expander ouvert).
+
+    Sans 'path', le fichier est temporaire et supprimé à la fermeture.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            self._file = tempfile.TemporaryFile()
+        else:
+            self._file = open(path, "w+b")
+        self._size = 0
+        self._mmap = None
+        self._mapped_size = 0
+        # get() peut être appelé depuis plusieurs threads (corpus_service)
+        self._lock = threading.Lock()
+
+    def append(self, text):
+        data = (text or "").encode("utf-8")
+        offset = self._size
+        if data:
+            self._file.seek(offset)
+            self._file.write(data)
+            self._size += len(data)
+        return (offset, len(data))
+
+    def get(self, offset, length):
+        if length <= 0:
+            return ""
+        end = offset + length
+        if end > self._size:
+            raise IndexError(f"Référence hors du store : ({offset}, {length})")
+        with self._lock:
+            if end > self._mapped_size:
+                self._remap()
+            return self._mmap[offset:end].decode("utf-8")
+
+    def _remap(self):
+        # Le fichier n'a fait que grandir : on recrée le mapping à la bonne taille
+        self._file.flush()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+        self._mapped_size = self._size
+
+    def __len__(self):
+        return self._size
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._mapped_size = 0
+        self._file.close()
+
+    def __del__(self):
+        # Store abandonné sans close() (ex. entrée de cache évincée)
+        if getattr(self, "_file", None) is not None:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def externalize_snippets(all_data, store):
+    """
+    Déplace dans 'store' les textes de all_data (modifié en place) :
+      - timeline_points[*]["paragraph_snippet"] -> "snippet_refs": [(offset, length)]
+      - global_stats.global_chronology[*]["paragraph_text"] -> "paragraph_text_ref": (offset, length)
+
+    "snippet_refs" est une liste pour que merge_consecutive_timeline_points
+    puisse fusionner des points sans décoder leurs textes.
+    """
+    for item in all_data:
+        for dg in item.get("decision_graphs", []):
+            for tp in dg.get("timeline_points", []):
+                if "paragraph_snippet" in tp:
+                    tp["snippet_refs"] = [store.append(tp.pop("paragraph_snippet"))]
+
+        gs = item.get("global_stats")
+        if gs:
+            for c in gs.get("global_chronology", []):
+                if "paragraph_text" in c:
+                    c["paragraph_text_ref"] = store.append(c.pop("paragraph_text"))
+    return all_data
+
+def resolve_snippet(point, store=None, max_chars=None):
+    """
+    Texte d'un point de timeline : "paragraph_snippet" s'il est encore en
+    mémoire, sinon décodé depuis le store via "snippet_refs".
+    Avec max_chars, on s'arrête dès qu'on a assez de texte.
+    """
+    if "paragraph_snippet" in point or store is None:
+        snippet = point.get("paragraph_snippet", "")
+        return snippet if max_chars is None else snippet[:max_chars]
+
+    parts = []
+    nb_chars = 0
+    for offset, length in point.get("snippet_refs", []):
+        text = store.get(offset, length)
+        if not text:
+            continue
+        if parts:
+            nb_chars += len(SNIPPET_SEPARATOR)
+        parts.append(text)
+        nb_chars += len(text)
+        if max_chars is not None and nb_chars >= max_chars:
+            break
+    snippet = SNIPPET_SEPARATOR.join(parts)
+    return snippet if max_chars is None else snippet[:max_chars]
+
+def resolve_paragraph_text(chrono_entry, store=None):
+    """
+    Texte d'une entrée de global_chronology (en mémoire ou dans le store).
+    """
+    if "paragraph_text" in chrono_entry or store is None:
+        return chrono_entry.get("paragraph_text", "")
+    ref = chrono_entry.get("paragraph_text_ref")
+    if not ref:
+        return ""
+    return store.get(*ref)
+
+def inline_snippets(item, store=None):
+    """
+    Copie d'un dict fichier de all_data avec les textes réintégrés
+    ("paragraph_snippet", "paragraph_text") à la place des références :
+    utile pour l'envoyer à un processus qui n'a pas accès au store.
+    """
+    item = copy.deepcopy(item)
+    if store is None:
+        return item
+    for dg in item.get("decision_graphs", []):
+        for tp in dg.get("timeline_points", []):
+            if "snippet_refs" in tp:
+                tp["paragraph_snippet"] = resolve_snippet(tp, store)
+                del tp["snippet_refs"]
+    gs = item.get("global_stats")
+    if gs:
+        for c in gs.get("global_chronology", []):
+            if "paragraph_text_ref" in c:
+                c["paragraph_text"] = resolve_paragraph_text(c, store)
+                del c["paragraph_text_ref"]
+    return item
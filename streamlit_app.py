@@ -8,8 +8,14 @@ import plotly.graph_objects as go
 import networkx as nx
 from pyvis.network import Network
 import streamlit.components.v1 as components
+import pandas as pd
 from collections import Counter, defaultdict
 
+from aggregator import GlobalTimelineView, build_decision_vote_tables
+from date_index import activity_over_time, build_date_index, build_file_dates, undated_files
+from corpus_service import CORPUS_SERVICE_ENV, CorpusServiceError, LocalCorpus, get_corpus_client
+from snippet_store import SnippetStore, externalize_snippets, resolve_paragraph_text, resolve_snippet
+
 ################################################
 # 1) Agrégation (ancien aggregator.py) intégré
 ################################################
@@ -51,7 +57,7 @@ def aggregate_all_data(all_data):
         }
     }
 
-    global_index = 0
+    timelines = []
     for item in all_data:
         pa = item.get("presence_absence")
         if pa:
@@ -91,16 +97,9 @@ def aggregate_all_data(all_data):
             aggregated["sum_timeline_points"] += len(tpoints)
             transitions = dg.get("transitions", {})
 
+            timelines.append(tpoints)
             for tp in tpoints:
-                new_tp = {
-                    "index": global_index,
-                    "speaker": tp.get("speaker", "#unknown"),
-                    "wordcount": tp.get("wordcount", 0),
-                    "paragraph_snippet": tp.get("paragraph_snippet", "")
-                }
-                aggregated["global_decision_graph"]["timeline_points"].append(new_tp)
-                aggregated["global_decision_graph"]["all_speakers"].add(new_tp["speaker"])
-                global_index += 1
+                aggregated["global_decision_graph"]["all_speakers"].add(tp.get("speaker", "#unknown"))
 
             for tkey, tval in transitions.items():
                 aggregated["transition_counter"][tkey] += tval
@@ -120,6 +119,10 @@ def aggregate_all_data(all_data):
     aggregated["vote_result_counter"] = dict(aggregated["vote_result_counter"])
     aggregated["global_decision_graph"]["transitions"] = dict(aggregated["transition_counter"])
     aggregated["global_decision_graph"]["all_speakers"] = list(aggregated["global_decision_graph"]["all_speakers"])
+    aggregated["global_decision_graph"]["timeline_points"] = GlobalTimelineView(timelines)
+    aggregated["decisions_table"], aggregated["votes_table"] = build_decision_vote_tables(all_data)
+    aggregated["date_index"] = build_date_index(all_data)
+    aggregated["file_dates"] = build_file_dates(all_data, aggregated["date_index"])
 
     return aggregated
 
@@ -146,7 +149,7 @@ def display_votes(module_data):
             analysis = vote.get("analysis", {})
             st.write("**Analyse :**", analysis)
 
-def display_global_stats(module_data):
+def display_global_stats(module_data, snippet_store=None):
     st.header("Statistiques globales (par fichier)")
     total_paragraphs = module_data.get("total_paragraphs", 0)
     total_words = module_data.get("total_words", 0)
@@ -158,7 +161,7 @@ def display_global_stats(module_data):
         with st.expander("Voir la chronologie globale (FICHIER)"):
             for c in global_chrono:
                 paragraph_index = c.get("paragraph_index")
-                paragraph_text = c.get("paragraph_text", "")
+                paragraph_text = resolve_paragraph_text(c, snippet_store)
                 speakers = c.get("speakers", [])
                 st.markdown(f"- **Paragraphe {paragraph_index}** : {paragraph_text[:80]}...")
                 st.write(f"  Intervenant(s) : {speakers}")
@@ -232,9 +235,13 @@ def merge_consecutive_timeline_points(timeline_points):
     for point in timeline_points[1:]:
         if point.get("speaker") == current.get("speaker"):
             current["wordcount"] += point.get("wordcount", 0)
-            snippet = point.get("paragraph_snippet", "")
-            if snippet:
-                current["paragraph_snippet"] += " ... " + snippet
+            if "snippet_refs" in point:
+                # Textes dans le SnippetStore : on concatène les références
+                current["snippet_refs"] = current.get("snippet_refs", []) + point["snippet_refs"]
+            else:
+                snippet = point.get("paragraph_snippet", "")
+                if snippet:
+                    current["paragraph_snippet"] += " ... " + snippet
             if point.get("has_vote") or current.get("has_vote"):
                 current["has_vote"] = True
         else:
@@ -250,7 +257,8 @@ def plot_decision_timeline_interactive(
     file_key="",
     president=None,
     rapporteur=None,
-    secretary_general=None
+    secretary_general=None,
+    snippet_store=None
 ):
     """
     On trace lines+markers en Plotly, 
@@ -309,7 +317,8 @@ def plot_decision_timeline_interactive(
     for i, pt in enumerate(merged_points):
         spk = pt.get("speaker", "#unknown")
         wc = pt.get("wordcount", 0)
-        snippet = pt.get("paragraph_snippet", "")
+        # Décodé depuis le SnippetStore seulement ici, pour l'étiquette
+        snippet = resolve_snippet(pt, snippet_store, max_chars=100)
         has_vote = pt.get("has_vote", False)
 
         x_vals.append(i)
@@ -398,11 +407,12 @@ def display_decision_graphs_interactive(
     file_key="",
     president=None,
     rapporteur=None,
-    secretary_general=None
+    secretary_general=None,
+    snippet_store=None
 ):
     """
     On ajoute la possibilité de passer president/rapporteur/secretary_general
-    pour le timeline plot (couleurs).
+    pour le timeline plot (couleurs), et le SnippetStore des textes.
     """
     st.header("Decision Graphs (Interactif)")
     if not module_data:
@@ -426,12 +436,101 @@ def display_decision_graphs_interactive(
                     file_key=file_key,
                     president=president,
                     rapporteur=rapporteur,
-                    secretary_general=secretary_general
+                    secretary_general=secretary_general,
+                    snippet_store=snippet_store
                 )
 
             if st.checkbox(f"Afficher transitions (PyVis) - {dec_id}", key=transition_checkbox_key):
                 plot_speaker_transition_interactive(transitions_dict, all_speakers, dec_id)
 
+def display_cross_tabs(decisions_table, votes_table):
+    """
+    Tableaux croisés sur les tables colonnaires produites par l'agrégation.
+    """
+    st.subheader("Résultats des votes par président")
+    if votes_table.empty:
+        st.write("Aucun vote.")
+    else:
+        st.dataframe(pd.crosstab(votes_table["president"], votes_table["result"]))
+
+    st.subheader("Décisions par rapporteur")
+    if decisions_table.empty:
+        st.write("Aucune décision.")
+    else:
+        by_rap = decisions_table.groupby("rapporteur", observed=True).agg(
+            decisions=("decision_index", "size"),
+            mots_moyens_rapporteur=("rapporteur_words", "mean"),
+            membres_presents_moyens=("nb_members_present", "mean"),
+        )
+        st.dataframe(by_rap)
+
+        st.subheader("Décisions par président et rapporteur")
+        st.dataframe(pd.crosstab(decisions_table["president"], decisions_table["rapporteur"]))
+
+def display_activity_over_time(agg):
+    """
+    Décisions / votes / mots par semaine ou par mois, à partir de l'index
+    des dates (dates_paragraphs des questions).
+    """
+    st.subheader("Activité dans le temps")
+    undated = undated_files(agg)
+    if undated["files"]:
+        st.caption(
+            f"{undated['files']} fichier(s) sans date de séance reconnue, non comptés ci-dessous "
+            f"({undated['decisions']} décision(s), {undated['votes']} vote(s))."
+        )
+    file_dates = agg["file_dates"]
+    if file_dates.empty:
+        st.write("Aucune date reconnue dans les questions.")
+        return
+
+    freq_label = st.radio("Période", ["Mois", "Semaine"], horizontal=True)
+    freq = "M" if freq_label == "Mois" else "W"
+    first = file_dates["date"].min().date()
+    last = file_dates["date"].max().date()
+    date_range = st.date_input("Intervalle", value=(first, last), min_value=first, max_value=last)
+    start, end = (date_range if len(date_range) == 2 else (first, last))
+
+    activity = activity_over_time(agg, freq=freq, start=start, end=end)
+    if activity.empty:
+        st.write("Aucun fichier dans cet intervalle.")
+        return
+
+    for col, title in [("decisions", "Décisions"), ("votes", "Votes"), ("words", "Mots")]:
+        fig = go.Figure(data=go.Bar(x=activity.index, y=activity[col]))
+        fig.update_layout(title=f"{title} par {freq_label.lower()}", height=300)
+        st.plotly_chart(fig, use_container_width=True)
+
+def display_speaker_ngrams(corpus):
+    """
+    Transitions recalculées depuis les timeline_points (et non depuis les
+    'transitions' précalculées) : n-grammes, fusion optionnelle des points
+    consécutifs, distribution des longueurs de tours de parole.
+    """
+    st.subheader("Transitions recalculées (timelines)")
+    n = st.number_input("Taille des n-grammes", min_value=2, max_value=6, value=2, step=1)
+    merge = st.checkbox("Fusionner les points consécutifs d'un même speaker", value=True)
+    res = corpus.speaker_transitions(n=int(n), merge_consecutive=merge)
+
+    st.write(f"**{len(res['ngrams'])}** n-grammes distincts")
+    st.json(dict(list(res["ngrams"].items())[:20]))
+
+    turn_lengths = res["turn_lengths"]
+    if turn_lengths:
+        fig = go.Figure(data=go.Bar(x=list(turn_lengths.keys()), y=list(turn_lengths.values())))
+        fig.update_layout(
+            title="Longueur des tours de parole",
+            xaxis_title="Points consécutifs d'un même speaker",
+            yaxis_title="Nombre de tours"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("Mots moyens par tour de parole (par speaker)"):
+        st.json(res["turn_words"])
+
+    if n == 2 and st.checkbox("Afficher ces transitions (PyVis)"):
+        plot_speaker_transition_interactive(res["ngrams"], res["all_speakers"], "GLOBAL (timelines)")
+
 ###################################
 # 4) Dictionnaire de displayers
 ###################################
@@ -448,22 +547,54 @@ MODULE_DISPLAYERS = {
 ###################################
 # 5) Main Streamlit
 ###################################
+# Nombre de points de la timeline globale affichés (et demandés) à la fois
+GLOBAL_TIMELINE_WINDOW = 500
+
+@st.cache_resource(max_entries=1)
+def load_local_corpus(json_file_path, mtime):
+    """
+    Charge, externalise et agrège le JSON une seule fois par processus
+    (et de nouveau seulement si le fichier change : 'mtime' fait partie de
+    la clé du cache). Les textes (snippets, chronologie) quittent la mémoire
+    Python : ils ne sont décodés depuis le SnippetStore qu'à l'affichage.
+    L'ancienne entrée évincée ferme son store à sa destruction.
+    """
+    all_data = load_extracted_data(json_file_path)
+    if not all_data:
+        return None
+    snippet_store = SnippetStore()
+    externalize_snippets(all_data, snippet_store)
+    return LocalCorpus(all_data, snippet_store, aggregated=aggregate_all_data(all_data))
+
 def main():
     st.title("Explorateur : Fichiers / Global + Graph Interactif")
 
     json_file_path = "extracted_data_modular_all_modules.json"
     mode = st.sidebar.radio("Mode d'affichage", ["Vue par fichier", "Vue globale"])
 
-    if not os.path.exists(json_file_path):
-        st.error(f"Fichier JSON introuvable : {json_file_path}")
-        return
+    # Avec CORPUS_SERVICE_URL, le corpus est chargé et agrégé une seule fois
+    # par corpus_service.py, partagé entre toutes les réplicas.
+    service_url = os.environ.get(CORPUS_SERVICE_ENV)
+    if service_url:
+        corpus = get_corpus_client(service_url)
+    else:
+        if not os.path.exists(json_file_path):
+            st.error(f"Fichier JSON introuvable : {json_file_path}")
+            return
+
+        corpus = load_local_corpus(json_file_path, os.path.getmtime(json_file_path))
+        if corpus is None:
+            st.warning("Le JSON est vide ou invalide.")
+            return
 
-    all_data = load_extracted_data(json_file_path)
-    if not all_data:
-        st.warning("Le JSON est vide ou invalide.")
-        return
+    try:
+        display_corpus(corpus, mode)
+    except CorpusServiceError as e:
+        st.error(str(e))
 
-    agg = aggregate_all_data(all_data)
+def display_corpus(corpus, mode):
+    snippet_store = corpus.snippet_store
+    agg = corpus.global_stats()
 
     # ---- VUE GLOBALE ----
     if mode == "Vue globale":
@@ -502,30 +633,51 @@ def main():
         st.subheader("Votes (résultats)")
         st.json(agg["vote_result_counter"])
 
+        if st.checkbox("Analyses croisées (décisions / votes)"):
+            display_cross_tabs(agg["decisions_table"], agg["votes_table"])
+
+        if st.checkbox("Activité dans le temps"):
+            display_activity_over_time(agg)
+
         # Graphes glo
         gdg = agg["global_decision_graph"]
         if st.checkbox("Afficher timeline global (Plotly)"):
-            tpoints = gdg["timeline_points"]
+            # Fenêtre bornée : on ne rapatrie (et ne décode) qu'une page de points
+            nb_points = corpus.timeline_length()
+            start = 0
+            if nb_points > GLOBAL_TIMELINE_WINDOW:
+                nb_pages = math.ceil(nb_points / GLOBAL_TIMELINE_WINDOW)
+                page = st.number_input(
+                    f"Page de la timeline globale ({GLOBAL_TIMELINE_WINDOW} points par page)",
+                    min_value=1, max_value=nb_pages, value=1, step=1
+                )
+                start = (int(page) - 1) * GLOBAL_TIMELINE_WINDOW
+            stop = min(start + GLOBAL_TIMELINE_WINDOW, nb_points)
+            st.caption(f"Points {start} à {max(stop - 1, start)} sur {nb_points}")
+            tpoints = corpus.timeline_slice(start, stop)
             plot_decision_timeline_interactive(
                 timeline_points=tpoints,
                 decision_id="GLOBAL",
-                file_key="GLOBAL"
+                file_key="GLOBAL",
+                snippet_store=snippet_store
             )
         if st.checkbox("Afficher transitions global (PyVis)"):
             transitions_dict = gdg["transitions"]
             all_sp = gdg["all_speakers"]
             plot_speaker_transition_interactive(transitions_dict, all_sp, "GLOBAL")
+        if st.checkbox("Analyser les transitions depuis les timelines (n-grammes)"):
+            display_speaker_ngrams(corpus)
         return
 
     # ---- VUE PAR FICHIER ----
     st.header("Vue par fichier")
-    file_names = [item["file"] for item in all_data if "file" in item]
+    file_names = corpus.file_names()
     if not file_names:
         st.warning("Aucun fichier dans le JSON.")
         return
 
     selected_file = st.selectbox("Sélectionnez un fichier :", file_names)
-    data_item = next((x for x in all_data if x.get("file") == selected_file), None)
+    data_item = corpus.get_file(selected_file)
     if not data_item:
         st.warning("Données non trouvées pour ce fichier.")
         return
@@ -552,8 +704,11 @@ def main():
                     file_key=selected_file,
                     president=the_president,
                     rapporteur=the_rapporteur,
-                    secretary_general=the_secgen
+                    secretary_general=the_secgen,
+                    snippet_store=snippet_store
                 )
+            elif key == "global_stats":
+                display_global_stats(mod_data, snippet_store=snippet_store)
             else:
                 display_func(mod_data)
         else: